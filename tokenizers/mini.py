@@ -2,9 +2,16 @@
 Minimal toy implementation of byte-pair encoding.
 """
 
+from array import array
+from collections import Counter
+from functools import lru_cache
+import heapq
+from itertools import chain, islice
+import mmap
 from pathlib import Path
-from typing import DefaultDict
+from typing import BinaryIO, DefaultDict, Iterator
 import struct
+import numpy as np
 from rich.console import Console
 from rich.table import Table
 import regex
@@ -13,37 +20,90 @@ console = Console()
 
 VOCAB_SIZE = 300
 
+# Pieces longer than this are unlikely to repeat, so they bypass the
+# per-piece encode cache.
+ENCODE_CACHE_MAX_PIECE_LEN = 256
+ENCODE_CACHE_SIZE = 131072
+
 EXAMPLE_STRING = "Hello world! こんにちは世界！🌍 This is a test. これはテストです。"
+# Compiled once at import. Case-insensitivity only matters for the
+# contraction letters, so it is scoped to that alternation instead of
+# applied to the whole pattern. The letter/digit/punct runs use possessive
+# quantifiers (++): nothing follows them in their branch, so giving
+# characters back can never help and the backtracking states are dropped.
+# The \s+(?!\S) branch must stay greedy-backtracking for the lookahead.
 GPT2_SPLIT_PATTERN = regex.compile(
-    r"""'s|'t|'re|'ve|'m|'ll|'d| ?[\p{L}]+| ?[\p{N}]+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
-    regex.IGNORECASE,
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)| ?[\p{L}]++| ?[\p{N}]++| ?[^\s\p{L}\p{N}]++|\s+(?!\S)|\s+"""
 )
 
 
-def str_to_ints(text: str) -> list[list[int]]:
-    return [
-        [int(b) for b in word.encode("utf-8")]
-        for word in regex.findall(GPT2_SPLIT_PATTERN, text)
-    ]
+def pack_pair(a: int, b: int) -> int:
+    """Pack a token pair into one int key; 20 bits covers vocabs up to ~1M."""
+    return (a << 20) | b
+
+
+def unpack_pair(key: int) -> tuple[int, int]:
+    return key >> 20, key & 0xFFFFF
+
+
+def pretokenize(text: str):
+    """Yield the UTF-8 bytes of each GPT-2 split piece of ``text``.
 
+    Single seam for the pre-tokenizer, so every caller splits identically.
+    """
+    for match in GPT2_SPLIT_PATTERN.finditer(text):
+        yield match.group().encode("utf-8")
+
+
+def pretokenize_counts(text: str) -> Counter:
+    """Count the pre-tokenized pieces of ``text``.
+
+    Picklable top-level function so multiprocessing workers can shard
+    pretokenization and the results can be merged with Counter.update.
+    """
+    return Counter(pretokenize(text))
 
-def get_pair_counts_from_text(text: str) -> dict[tuple[int, int], int]:
-    counts = DefaultDict(int)
+
+def bytes_to_word(piece: bytes) -> array:
+    """Widen UTF-8 bytes into an int token buffer without a Python loop."""
+    word = array("i")
+    word.frombytes(np.frombuffer(piece, dtype=np.uint8).astype(np.int32).tobytes())
+    return word
+
+
+def str_to_ints(text: str) -> Iterator[array]:
+    # Lazy: add() and the pair counters consume word buffers one at a time,
+    # so corpus growth is a single extend with no intermediate list.
+    return (bytes_to_word(piece) for piece in pretokenize(text))
+
+
+def get_pair_counts_from_text(text: str) -> dict[int, int]:
+    # Counter does the per-pair increments in C; pack only the unique pairs.
     words = str_to_ints(text)
-    for word in words:
-        pairs = list(zip(word, word[1:]))
-        for pair in pairs:
-            counts[pair] += 1
-    return counts
+    pair_counts = Counter(
+        chain.from_iterable(zip(word, islice(word, 1, None)) for word in words)
+    )
+    return {pack_pair(a, b): count for (a, b), count in pair_counts.items()}
+
+
+def count_pairs_np(buf) -> tuple[np.ndarray, np.ndarray]:
+    """Count adjacent token pairs in one vectorized pass.
+
+    Packs each pair (a, b) into a single int64 key (same layout as
+    pack_pair) and lets numpy dedupe and count, so no Python loop runs
+    per element. Returns (keys, counts) arrays.
+    """
+    arr = np.asarray(buf, dtype=np.int64)
+    if arr.size < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    keys = (arr[:-1] << 20) | arr[1:]
+    return np.unique(keys, return_counts=True)
 
 
-def get_pair_counts_from_bytes(byte_list: list[int]) -> dict[tuple[int, int], int]:
-    counts = DefaultDict(int)
-    pairs = list(zip(byte_list, byte_list[1:]))
-    for pair in pairs:
-        counts[pair] += 1
-    # return list(sorted(counts.items(), key=lambda kv: kv[1], reverse=True))
-    return counts
+def get_pair_counts_from_bytes(byte_list) -> dict[int, int]:
+    keys, counts = count_pairs_np(byte_list)
+    return dict(zip(keys.tolist(), counts.tolist()))
 
 
 def examine_bytes(text: str):
@@ -56,42 +116,64 @@ def examine_bytes(text: str):
     table.add_row("Length", str(len(byte_list)))
     console.print(table)
 
-    pairs_sorted = get_pair_counts_from_text(text)
-    console.print(pairs_sorted)
+    pair_counts = get_pair_counts_from_text(text)
+    console.print({unpack_pair(key): count for key, count in pair_counts.items()})
 
 
-def _get_max_pair(counts: dict[tuple[int, int], int]) -> tuple[int, int]:
-    return max(counts.items(), key=lambda kv: kv[1])[0]
+def _get_max_pair(counts: dict[int, int]) -> tuple[int, int]:
+    return unpack_pair(max(counts, key=counts.__getitem__))
 
 
-def replace_pair_with_token(tokens: list[int], pair: tuple[int, int], new_token: int):
-    i = 0
-    while i < len(tokens) - 1:
-        if (tokens[i], tokens[i + 1]) == pair:
-            yield new_token
-            i += 2
-            continue
-        yield tokens[i]
-        i += 1
-    if i < len(tokens):
-        yield tokens[-1]
+def replace_pair_inplace(buf: array, a: int, b: int, z: int) -> int:
+    """Merge every (a, b) pair in ``buf`` into ``z``, truncating in place.
+
+    Two-cursor sweep: ``r`` reads, ``w`` writes, so no intermediate list or
+    per-element generator overhead. Returns the new length.
+    """
+    r = w = 0
+    n = len(buf)
+    while r < n:
+        if r + 1 < n and buf[r] == a and buf[r + 1] == b:
+            buf[w] = z
+            r += 2
+        else:
+            buf[w] = buf[r]
+            r += 1
+        w += 1
+    del buf[w:]
+    return w
+
+
+def _ranks_from_merges(
+    merges: list[tuple[tuple[int, int], int]],
+) -> dict[int, tuple[int, int]]:
+    """Map each packed pair to its (merge rank, new token)."""
+    return {
+        pack_pair(pair[0], pair[1]): (rank, token)
+        for rank, (pair, token) in enumerate(merges)
+    }
 
 
 def encode(text: str) -> tuple[list[int], dict[tuple[int, int], int]]:
     merges = {}
     counts = get_pair_counts_from_text(text)
-    tokens = [int(x) for x in text.encode("utf-8")]
+    tokens = bytes_to_word(text.encode("utf-8"))
     new_token = 256
     pair = _get_max_pair(counts)
     console.log(pair)
-    console.log(counts[pair])
-    while counts[pair] > 1 and new_token < VOCAB_SIZE:
+    best_count = counts[pack_pair(*pair)]
+    console.log(best_count)
+    while best_count > 1 and new_token < VOCAB_SIZE:
         merges[pair] = new_token
-        tokens = list(replace_pair_with_token(tokens, pair, new_token))
-        counts = get_pair_counts_from_bytes(tokens)
-        pair = _get_max_pair(counts)
+        replace_pair_inplace(tokens, pair[0], pair[1], new_token)
+        keys, pair_counts = count_pairs_np(tokens)
+        if keys.size == 0:
+            break
+        best = int(np.argmax(pair_counts))
+        pair = unpack_pair(int(keys[best]))
+        best_count = int(pair_counts[best])
         new_token += 1
-    return tokens, merges
+    return list(tokens), merges
 
 
 def examine_tokenized(text: str, tokens: list[int], merges: dict[tuple[int, int], int]):
@@ -107,107 +189,277 @@ def examine_tokenized(text: str, tokens: list[int], merges: dict[tuple[int, int]
     console.print(table)
 
 
-def decode(tokens: list[int], merges: dict[tuple[int, int], int]):
-    vocab = {i: bytes([i]) for i in range(256)}
-
-    for pair, token in merges.items():
+def _vocab_from_merges(merges) -> list[bytes]:
+    """Build the id-indexed byte vocabulary from (pair, token) merges."""
+    vocab = [bytes([i]) for i in range(256)]
+    for pair, token in merges:
+        while len(vocab) <= token:
+            vocab.append(b"")
         vocab[token] = vocab[pair[0]] + vocab[pair[1]]
+    return vocab
+
 
-    def gen():
-        for token in tokens:
-            seq = vocab.get(token, [])
-            yield from seq
+def decode(tokens: list[int], merges: dict[tuple[int, int], int]):
+    vocab = _vocab_from_merges(merges.items())
 
-    return bytes(gen()).decode("utf-8", errors="replace")
+    # Single C-level concatenation with plain list indexing; out-of-range
+    # tokens decode to nothing, as the old vocab.get(token, []) fallback did.
+    size = len(vocab)
+    buf = b"".join(vocab[token] for token in tokens if 0 <= token < size)
+    return buf.decode("utf-8", errors="replace")
 
 
 class Tokenizer:
     def __init__(self, vocab_size=None) -> None:
         self._built = False
         self.vocab_size = vocab_size or VOCAB_SIZE
-        self.counts: DefaultDict[tuple[int, int], int] = DefaultDict(int)
+        self.counts: DefaultDict[int, int] = DefaultDict(int)
         self.merges: list[tuple[tuple[int, int], int]] = []
-        self.corpus: list[list[int]] = []
-
-    def add(self, text: str):
+        self.corpus: list[array] = []
+        # Per-word frequency, parallel to corpus: duplicate texts can be
+        # added once with a count instead of being re-pretokenized.
+        self.weights: list[int] = []
+        # Two per-instance cache levels: whole texts (captions repeat across
+        # epochs) and individual pieces (natural text repeats words heavily).
+        self._encode_text = lru_cache(maxsize=ENCODE_CACHE_SIZE)(self._encode_text)
+        self._encode_piece = lru_cache(maxsize=ENCODE_CACHE_SIZE)(self._encode_piece)
+
+    def add(self, text: str, count: int = 1):
         if self._built:
             raise ValueError("Vocabulary already built")
+        before = len(self.corpus)
         self.corpus.extend(str_to_ints(text))
+        self.weights.extend([count] * (len(self.corpus) - before))
+
+    def add_piece_counts(self, piece_counts: dict[bytes, int]):
+        """Add already pre-tokenized (piece bytes -> frequency) counts."""
+        if self._built:
+            raise ValueError("Vocabulary already built")
+        for piece, count in piece_counts.items():
+            self.corpus.append(bytes_to_word(piece))
+            self.weights.append(count)
 
     def build(self):
         if self._built:
             raise ValueError("Vocabulary already built")
         self._built = True
 
-        # Count all pairs in the corpus
-        for word in self.corpus:
-            pairs = list(zip(word, word[1:]))
-            for pair in pairs:
-                self.counts[pair] += 1
+        counts = self.counts
+        corpus = self.corpus
+
+        # One-shot initial count: flatten the corpus into a single int32
+        # buffer with a -1 sentinel between words (so no pair straddles a
+        # word boundary), then pack and count every pair with np.unique's
+        # C-level sort instead of per-pair dict increments.
+        weights = self.weights
+        if corpus:
+            sep = np.array([-1], dtype=np.int32)
+            parts = []
+            wparts = []
+            for word, weight in zip(corpus, weights):
+                buf = np.frombuffer(word, dtype=np.int32)
+                parts.append(buf)
+                parts.append(sep)
+                wparts.append(np.full(buf.size + 1, weight, dtype=np.int64))
+            ids = np.concatenate(parts[:-1]).astype(np.int64)
+            wts = np.concatenate(wparts)[: ids.size]
+            # Drop the frombuffer views so the words can be resized in place
+            # during the merge phase.
+            del parts, buf
+            if ids.size >= 2:
+                left, right = ids[:-1], ids[1:]
+                mask = (left >= 0) & (right >= 0)
+                keys = (left[mask] << 20) | right[mask]
+                # Each pair contributes the frequency of the word it sits in.
+                uniq, inverse = np.unique(keys, return_inverse=True)
+                sums = np.bincount(inverse, weights=wts[:-1][mask])
+                for key, count in zip(uniq.tolist(), sums.tolist()):
+                    counts[key] = int(count)
+
+        # Remember which words contain each pair so each merge only touches
+        # the words where the pair actually occurs.
+        where: DefaultDict[int, set[int]] = DefaultDict(set)
+        for w, word in enumerate(corpus):
+            for a, b in set(zip(word, islice(word, 1, None))):
+                where[pack_pair(a, b)].add(w)
+
+        # Lazy max-heap of (negated count, packed pair). Entries go stale
+        # whenever a count changes; stale pops are discarded and re-pushed
+        # with the live count so the top of the heap always converges on the
+        # true maximum.
+        heap = [(-count, key) for key, count in counts.items()]
+        heapq.heapify(heap)
+
+        # Bind the hot callables once; the merge sweep below runs per token
+        # occurrence and global/attribute lookups add up.
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        counts_get = counts.get
+
+        def inc(key: int, w: int, weight: int):
+            c = counts_get(key, 0) + weight
+            counts[key] = c
+            where[key].add(w)
+            heappush(heap, (-c, key))
+
+        def dec(key: int, weight: int):
+            c = counts_get(key, 0) - weight
+            if c > 0:
+                counts[key] = c
+            else:
+                counts.pop(key, None)
 
         # Build the vocabulary using BPE
         new_token = 256
-        while new_token < self.vocab_size:
-            if not self.counts:
-                break
-
-            # Find the most frequent pair
-            pair = max(self.counts.items(), key=lambda kv: kv[1])[0]
-            if self.counts[pair] <= 1:
+        while new_token < self.vocab_size and heap:
+            neg_count, key = heappop(heap)
+            live = counts_get(key, 0)
+            if live != -neg_count:
+                if live > 1:
+                    heappush(heap, (-live, key))
+                continue
+            if live <= 1:
                 break
 
             # Record the merge
-            self.merges.append((pair, new_token))
-
-            # Update the corpus by replacing the pair with new token
-            new_corpus = []
-            for word in self.corpus:
-                new_word = list(replace_pair_with_token(word, pair, new_token))
-                new_corpus.append(new_word)
-            self.corpus = new_corpus
-
-            # Recompute counts
-            self.counts = DefaultDict(int)
-            for word in self.corpus:
-                pairs = list(zip(word, word[1:]))
-                for pair in pairs:
-                    self.counts[pair] += 1
+            a, b = unpack_pair(key)
+            self.merges.append(((a, b), new_token))
+
+            # Merge every occurrence, adjusting only the pair counts that
+            # straddle each merge site instead of recounting the corpus.
+            for w in where.pop(key):
+                word = corpus[w]
+                weight = weights[w]
+                # Two-cursor in-place rewrite (same sweep as
+                # replace_pair_inplace) interleaved with count updates.
+                r = wr = 0
+                n = len(word)
+                while r < n:
+                    if r + 1 < n and word[r] == a and word[r + 1] == b:
+                        if wr:
+                            prev = word[wr - 1]
+                            # An adjacent merge just to the left means the
+                            # old pair here ended in b, not prev.
+                            dec(pack_pair(b if prev == new_token else prev, a), weight)
+                            inc(pack_pair(prev, new_token), w, weight)
+                        word[wr] = new_token
+                        r += 2
+                    else:
+                        x = word[r]
+                        if wr and word[wr - 1] == new_token:
+                            dec(pack_pair(b, x), weight)
+                            inc(pack_pair(new_token, x), w, weight)
+                        word[wr] = x
+                        r += 1
+                    wr += 1
+                del word[wr:]
+            counts.pop(key, None)
 
             new_token += 1
 
         # Build vocabulary mapping
-        self.vocab = {i: bytes([i]) for i in range(256)}
-
-        for pair, token in self.merges:
-            self.vocab[token] = self.vocab[pair[0]] + self.vocab[pair[1]]
+        self.vocab = _vocab_from_merges(self.merges)
+        self.ranks = _ranks_from_merges(self.merges)
+
+    def _merge_piece(self, piece: bytes) -> list[int]:
+        """BPE-merge one pre-tokenized piece.
+
+        Doubly-linked list over the byte sequence plus a min-heap keyed by
+        merge rank: pop the best available merge, splice, then push the two
+        newly adjacent candidates. O(n log n) per piece instead of applying
+        every merge in sequence.
+        """
+        tokens = list(piece)
+        n = len(tokens)
+        if n < 2:
+            return tokens
+
+        ranks_get = self.ranks.get
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        nxt = list(range(1, n + 1))
+        prv = list(range(-1, n))
+
+        heap = []
+        for i in range(n - 1):
+            entry = ranks_get(pack_pair(tokens[i], tokens[i + 1]))
+            if entry is not None:
+                heap.append((entry[0], i))
+        heapq.heapify(heap)
+
+        while heap:
+            rank, i = heappop(heap)
+            if tokens[i] < 0:
+                continue  # spliced out by an earlier merge
+            j = nxt[i]
+            if j >= n:
+                continue
+            entry = ranks_get(pack_pair(tokens[i], tokens[j]))
+            if entry is None or entry[0] != rank:
+                continue  # stale: the pair here has changed
+
+            # Merge: write the new token at i and splice out j.
+            tokens[i] = entry[1]
+            tokens[j] = -1
+            k = nxt[j]
+            nxt[i] = k
+            if k < n:
+                prv[k] = i
+
+            left = prv[i]
+            if left >= 0:
+                entry = ranks_get(pack_pair(tokens[left], tokens[i]))
+                if entry is not None:
+                    heappush(heap, (entry[0], left))
+            if k < n:
+                entry = ranks_get(pack_pair(tokens[i], tokens[k]))
+                if entry is not None:
+                    heappush(heap, (entry[0], i))
+
+        out = []
+        i = 0
+        while i < n:
+            out.append(tokens[i])
+            i = nxt[i]
+        return out
+
+    def _encode_piece(self, piece: bytes) -> tuple[int, ...]:
+        return tuple(self._merge_piece(piece))
+
+    def _encode_text(self, text: str) -> tuple[int, ...]:
+        tokens: list[int] = []
+        for piece in pretokenize(text):
+            if len(piece) > ENCODE_CACHE_MAX_PIECE_LEN:
+                tokens.extend(self._merge_piece(piece))
+            else:
+                tokens.extend(self._encode_piece(piece))
+        return tuple(tokens)
 
     def encode(self, text: str) -> list[int]:
         if not self._built:
             raise ValueError("Vocabulary not built yet. Call build() first.")
 
-        tokens = [int(x) for x in text.encode("utf-8")]
-
-        # Apply merges in order
-        for pair, new_token in self.merges:
-            tokens = list(replace_pair_with_token(tokens, pair, new_token))
-
-        return tokens
+        return list(self._encode_text(text))
 
     def decode(self, tokens: list[int]) -> str:
         if not self._built:
             raise ValueError("Vocabulary not built yet. Call build() first.")
 
-        # Decode tokens
-        def gen():
-            for token in tokens:
-                seq = self.vocab.get(token, [])
-                yield from seq
+        # Decode tokens with one C-level concatenation and plain list
+        # indexing; out-of-range tokens decode to nothing, matching the old
+        # .get(token, []) fallback.
+        vocab = self.vocab
+        size = len(vocab)
+        buf = b"".join(vocab[token] for token in tokens if 0 <= token < size)
+        return buf.decode("utf-8", errors="replace")
 
-        return bytes(gen()).decode("utf-8", errors="replace")
 
+MERGE_STRUCT = struct.Struct("<III")
+HEADER_STRUCT = struct.Struct("<II")
 
-def save_tokenizer(tokenizer: Tokenizer, path: Path | str):
-    """Save tokenizer to binary file.
+
+def save_tokenizer(tokenizer: Tokenizer, path_or_file: Path | str | BinaryIO):
+    """Save tokenizer to a binary file path or writable file-like object.
 
     Format:
     [ 4 bytes file version (1) ]
@@ -219,63 +471,63 @@ def save_tokenizer(tokenizer: Tokenizer, path: Path | str):
     if not tokenizer._built:
         raise ValueError("Tokenizer must be built before saving")
 
-    with open(path, "wb") as f:
-        # Write file version
-        f.write(struct.pack("<I", 1))
-
-        # Write entry count
-        f.write(struct.pack("<I", len(tokenizer.merges)))
-
-        # Write merge entries
-        for pair, token in tokenizer.merges:
-            # Write pair (8 bytes: 4 bytes each for pair[0] and pair[1])
-            f.write(struct.pack("<II", pair[0], pair[1]))
-            # Write token value (4 bytes)
-            f.write(struct.pack("<I", token))
-
-
-def load_tokenizer(path: str) -> Tokenizer:
-    """Load tokenizer from binary file."""
-    with open(path, "rb") as f:
-        # Read file version
-        version_bytes = f.read(4)
-        if len(version_bytes) != 4:
-            raise ValueError("Invalid file format: missing version")
-        version = struct.unpack("<I", version_bytes)[0]
-
-        if version != 1:
-            raise ValueError(f"Unsupported file version: {version}")
-
-        # Read entry count
-        count_bytes = f.read(4)
-        if len(count_bytes) != 4:
-            raise ValueError("Invalid file format: missing entry count")
-        count = struct.unpack("<I", count_bytes)[0]
-
-        # Create new tokenizer
-        tokenizer = Tokenizer()
-        tokenizer._built = True
-        tokenizer.merges = []
-
-        # Read merge entries
-        for _ in range(count):
-            # Read pair (8 bytes)
-            pair_bytes = f.read(8)
-            if len(pair_bytes) != 8:
-                raise ValueError("Invalid file format: incomplete pair data")
-            pair0, pair1 = struct.unpack("<II", pair_bytes)
-
-            # Read token value (4 bytes)
-            token_bytes = f.read(4)
-            if len(token_bytes) != 4:
-                raise ValueError("Invalid file format: incomplete token data")
-            token = struct.unpack("<I", token_bytes)[0]
-
-            tokenizer.merges.append(((pair0, pair1), token))
-
-        # Build vocabulary mapping
-        tokenizer.vocab = {i: bytes([i]) for i in range(256)}
-        for pair, token in tokenizer.merges:
-            tokenizer.vocab[token] = tokenizer.vocab[pair[0]] + tokenizer.vocab[pair[1]]
-
-        return tokenizer
+    # Flatten the merges into one contiguous little-endian int32 [M, 3]
+    # array and write header + body in two calls.
+    merge_arr = np.array(
+        [(a, b, token) for (a, b), token in tokenizer.merges], dtype="<i4"
+    ).reshape(-1, 3)
+
+    if hasattr(path_or_file, "write"):
+        path_or_file.write(HEADER_STRUCT.pack(1, len(tokenizer.merges)))
+        path_or_file.write(merge_arr.tobytes())
+    else:
+        with open(path_or_file, "wb") as f:
+            f.write(HEADER_STRUCT.pack(1, len(tokenizer.merges)))
+            f.write(merge_arr.tobytes())
+
+
+def load_tokenizer(path_or_file: Path | str | BinaryIO) -> Tokenizer:
+    """Load tokenizer from a binary file path or readable file-like object."""
+    # File paths are memory-mapped read-only so the header and merge table
+    # decode straight from file-backed pages; streams are read whole.
+    if hasattr(path_or_file, "read"):
+        data = path_or_file.read()
+    else:
+        with open(path_or_file, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                data = b""  # empty files cannot be mapped
+
+    if len(data) < 4:
+        raise ValueError("Invalid file format: missing version")
+    version = struct.unpack_from("<I", data, 0)[0]
+
+    if version != 1:
+        raise ValueError(f"Unsupported file version: {version}")
+
+    if len(data) < HEADER_STRUCT.size:
+        raise ValueError("Invalid file format: missing entry count")
+    count = struct.unpack_from("<I", data, 4)[0]
+
+    if len(data) < HEADER_STRUCT.size + count * MERGE_STRUCT.size:
+        raise ValueError("Invalid file format: incomplete merge data")
+
+    # Create new tokenizer
+    tokenizer = Tokenizer()
+    tokenizer._built = True
+    merge_arr = np.frombuffer(
+        data, dtype="<i4", offset=HEADER_STRUCT.size, count=3 * count
+    ).reshape(-1, 3)
+    tokenizer.merges = [((a, b), token) for a, b, token in merge_arr.tolist()]
+
+    # merges are materialized, so the mapping can be released.
+    del merge_arr
+    if isinstance(data, mmap.mmap):
+        data.close()
+
+    # Build vocabulary mapping
+    tokenizer.vocab = _vocab_from_merges(tokenizer.merges)
+    tokenizer.ranks = _ranks_from_merges(tokenizer.merges)
+
+    return tokenizer
@@ -1,34 +1,37 @@
+from collections import Counter
+import io
 import pytest
-import tempfile
-import os
-from ..mini import Tokenizer, save_tokenizer, load_tokenizer
+from ..mini import Tokenizer, pretokenize_counts, save_tokenizer, load_tokenizer
 
 
-class TestTokenizer:
-    def test_basic_functionality(self):
-        """Test basic add, build, encode, decode functionality"""
-        tokenizer = Tokenizer()
+TRAINING_TEXTS = ["Hello world!", "This is a test.", "Hello again!"]
 
-        # Add some sample text
-        tokenizer.add("Hello world!")
-        tokenizer.add("This is a test.")
-        tokenizer.add("Hello again!")
 
-        # Build the vocabulary
-        tokenizer.build()
+@pytest.fixture(scope="module")
+def trained_tokenizer():
+    """Tokenizer trained once on the shared corpus; tests must not mutate it."""
+    tokenizer = Tokenizer()
+    for text in TRAINING_TEXTS:
+        tokenizer.add(text)
+    tokenizer.build()
+    return tokenizer
+
 
+class TestTokenizer:
+    def test_basic_functionality(self, trained_tokenizer):
+        """Test basic add, build, encode, decode functionality"""
         # Test encoding
         test_text = "Hello world!"
-        tokens = tokenizer.encode(test_text)
+        tokens = trained_tokenizer.encode(test_text)
 
         # Test decoding
-        decoded = tokenizer.decode(tokens)
+        decoded = trained_tokenizer.decode(tokens)
 
         # Verify round-trip
         assert decoded == test_text
 
         # Verify tokenizer learned some merges
-        assert len(tokenizer.merges) > 0
+        assert len(trained_tokenizer.merges) > 0
 
     def test_cannot_add_after_build(self):
         """Test that adding text after build raises error"""
@@ -69,6 +72,32 @@ class TestTokenizer:
         decoded = tokenizer.decode(tokens)
         assert decoded == "Hi"
 
+    def test_weighted_add_matches_repeated_add(self):
+        """Adding text with a count should train like adding it that many times"""
+        weighted = Tokenizer()
+        weighted.add("Hello world!", count=3)
+        weighted.add("This is a test.")
+        weighted.build()
+
+        repeated = Tokenizer()
+        for _ in range(3):
+            repeated.add("Hello world!")
+        repeated.add("This is a test.")
+        repeated.build()
+
+        assert weighted.merges == repeated.merges
+
+    def test_add_piece_counts_matches_add(self, trained_tokenizer):
+        """Adding pre-tokenized piece counts should train like add()"""
+        counted = Tokenizer()
+        pieces = Counter()
+        for text in TRAINING_TEXTS:
+            pieces.update(pretokenize_counts(text))
+        counted.add_piece_counts(pieces)
+        counted.build()
+
+        assert counted.merges == trained_tokenizer.merges
+
     def test_unicode_text(self):
         """Test with unicode text"""
         tokenizer = Tokenizer()
@@ -81,100 +110,70 @@ class TestTokenizer:
         decoded = tokenizer.decode(tokens)
         assert decoded == test_text
 
-    def test_save_load_roundtrip(self):
+    def test_save_load_roundtrip(self, trained_tokenizer):
         """Test saving and loading tokenizer preserves functionality"""
-        # Create and train original tokenizer
-        original = Tokenizer()
-        original.add("Hello world!")
-        original.add("This is a test.")
-        original.add("Hello again!")
-        original.build()
+        original = trained_tokenizer
 
         # Test with the original
         test_text = "Hello world!"
         original_tokens = original.encode(test_text)
         original_decoded = original.decode(original_tokens)
 
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            temp_path = f.name
-
-        try:
-            save_tokenizer(original, temp_path)
-
-            # Load from file
-            loaded = load_tokenizer(temp_path)
+        # Round-trip through an in-memory buffer
+        buf = io.BytesIO()
+        save_tokenizer(original, buf)
+        buf.seek(0)
+        loaded = load_tokenizer(buf)
 
-            # Test that loaded tokenizer works the same
-            loaded_tokens = loaded.encode(test_text)
-            loaded_decoded = loaded.decode(loaded_tokens)
+        # Test that loaded tokenizer works the same
+        loaded_tokens = loaded.encode(test_text)
+        loaded_decoded = loaded.decode(loaded_tokens)
 
-            # Verify same results
-            assert loaded_tokens == original_tokens
-            assert loaded_decoded == original_decoded
-            assert loaded_decoded == test_text
+        # Verify same results
+        assert loaded_tokens == original_tokens
+        assert loaded_decoded == original_decoded
+        assert loaded_decoded == test_text
 
-            # Verify internal state matches
-            assert len(loaded.merges) == len(original.merges)
-            assert loaded.merges == original.merges
-            assert loaded._built
+        # Verify internal state matches
+        assert len(loaded.merges) == len(original.merges)
+        assert loaded.merges == original.merges
+        assert loaded._built
 
-        finally:
-            os.unlink(temp_path)
-
-    def test_save_unbuilt_tokenizer(self):
+    def test_save_unbuilt_tokenizer(self, tmp_path):
         """Test that saving unbuilt tokenizer raises error"""
         tokenizer = Tokenizer()
         tokenizer.add("Hello")
 
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            temp_path = f.name
-
-        try:
-            with pytest.raises(
-                ValueError, match="Tokenizer must be built before saving"
-            ):
-                save_tokenizer(tokenizer, temp_path)
-        finally:
-            os.unlink(temp_path)
+        with pytest.raises(ValueError, match="Tokenizer must be built before saving"):
+            save_tokenizer(tokenizer, tmp_path / "tokenizer.bin")
 
-    def test_load_invalid_file(self):
+    def test_load_invalid_file(self, tmp_path):
         """Test loading invalid file raises appropriate errors"""
         # Test with non-existent file
         with pytest.raises(FileNotFoundError):
             load_tokenizer("nonexistent.bin")
 
         # Test with invalid format
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            f.write(b"invalid data")
-            temp_path = f.name
+        invalid_path = tmp_path / "invalid.bin"
+        invalid_path.write_bytes(b"invalid data")
 
-        try:
-            with pytest.raises(ValueError, match="Unsupported file version"):
-                load_tokenizer(temp_path)
-        finally:
-            os.unlink(temp_path)
+        with pytest.raises(ValueError, match="Unsupported file version"):
+            load_tokenizer(invalid_path)
 
-    def test_empty_tokenizer_save_load(self):
+    def test_empty_tokenizer_save_load(self, tmp_path):
         """Test save/load with empty tokenizer (no merges)"""
         original = Tokenizer()
         original.build()  # Build without adding any text
 
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            temp_path = f.name
-
-        try:
-            save_tokenizer(original, temp_path)
-            loaded = load_tokenizer(temp_path)
+        temp_path = tmp_path / "tokenizer.bin"
+        save_tokenizer(original, temp_path)
+        loaded = load_tokenizer(temp_path)
 
-            # Should work with basic byte encoding
-            test_text = "Hi"
-            original_tokens = original.encode(test_text)
-            loaded_tokens = loaded.encode(test_text)
-
-            assert loaded_tokens == original_tokens
-            assert loaded.decode(loaded_tokens) == test_text
-            assert len(loaded.merges) == 0
+        # Should work with basic byte encoding
+        test_text = "Hi"
+        original_tokens = original.encode(test_text)
+        loaded_tokens = loaded.encode(test_text)
 
-        finally:
-            os.unlink(temp_path)
+        assert loaded_tokens == original_tokens
+        assert loaded.decode(loaded_tokens) == test_text
+        assert len(loaded.merges) == 0
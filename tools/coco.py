@@ -1,28 +1,63 @@
+from collections import Counter
+import multiprocessing
 from pathlib import Path
+import sys
 from typing import TypedDict
 from datasets import load_dataset
+import pyarrow.compute as pc
 
 from rich import print
 
-from tokenizers.mini import Tokenizer, save_tokenizer
+from tokenizers.mini import Tokenizer, pretokenize_counts, save_tokenizer
 
 
 class Sample(TypedDict):
     captions: list[str]
 
 
+# coco2017 train split row count; streaming mode can't slice by percent,
+# so the old train[:1%] becomes take(round(TRAIN_ROWS / 100)) — HF percent
+# slicing rounds to the closest example, not down.
+TRAIN_ROWS = 118_287
+
+
 def get_captions():
-    dataset = load_dataset("phiyodr/coco2017", split="train[:1%]")
-    for item in dataset:
-        yield from (x.strip() for x in item["captions"])  # type: ignore
+    # Stream the split instead of downloading and caching all of it; the
+    # captions are only consumed once per training run. Arrow-formatted
+    # batches keep rows from being materialized as Python dicts, and
+    # stripping happens in C over the flattened values of each chunk.
+    dataset = load_dataset("phiyodr/coco2017", split="train", streaming=True)
+    take = round(TRAIN_ROWS / 100)
+    batches = dataset.take(take).with_format("arrow").iter(batch_size=1024)
+    for table in batches:
+        for chunk in table.column("captions").chunks:
+            # flatten() respects slice offsets; .values would re-emit the
+            # whole underlying batch for every sliced window.
+            yield from pc.utf8_trim_whitespace(chunk.flatten()).to_pylist()
 
 
 def build_tokenizer_from_captions(
     save_to: Path, vocab_size: int | None = None
 ) -> Tokenizer:
     tokenizer = Tokenizer(vocab_size=vocab_size)
-    for cap in get_captions():
-        tokenizer.add(cap)
+    # COCO captions repeat heavily; pretokenize each unique caption once,
+    # sharded across worker processes, and weight pieces by frequency.
+    # Interning lets duplicates share one string object, so the Counter
+    # lookup short-circuits on pointer equality and the copies are freed.
+    caption_counts = Counter(map(sys.intern, get_captions()))
+    unique_caps = list(caption_counts)
+    piece_counts: Counter = Counter()
+    with multiprocessing.Pool() as pool:
+        for cap, pieces in zip(
+            unique_caps, pool.imap(pretokenize_counts, unique_caps, chunksize=256)
+        ):
+            count = caption_counts[cap]
+            if count == 1:
+                piece_counts.update(pieces)
+            else:
+                for piece, n in pieces.items():
+                    piece_counts[piece] += n * count
+    tokenizer.add_piece_counts(piece_counts)
     tokenizer.build()
     save_tokenizer(tokenizer, save_to)
     print(f"saved to {save_to}")